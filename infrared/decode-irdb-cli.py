@@ -5,6 +5,7 @@ import importlib.util
 import argparse
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import serial
 import time
@@ -24,21 +25,56 @@ def install_package(package_name):
         print(f"Failed to install package: {package_name}. Please install it manually.")
         sys.exit(1)
 
+def dependency_sentinel(required_packages):
+    """
+    Path of the marker file recording that these packages were verified.
+    """
+    cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'flipper-scripts')
+    return os.path.join(cache_dir, 'deps-ok-' + '-'.join(sorted(required_packages)))
+
 def check_and_install_dependencies(required_packages):
     """
-    Check for required packages and install any that are missing.
+    Check for required packages and install any that are missing. The check
+    is skipped when FLIPPER_SKIP_DEPS=1 or a previous run already verified
+    the same set of packages.
     """
+    if os.environ.get('FLIPPER_SKIP_DEPS') == '1':
+        return
+    sentinel = dependency_sentinel(required_packages)
+    if os.path.exists(sentinel):
+        return
     for package in required_packages:
         if not importlib.util.find_spec(package):
             print(f"Package '{package}' not found. Installing...")
             install_package(package)
+    try:
+        os.makedirs(os.path.dirname(sentinel), exist_ok=True)
+        with open(sentinel, 'w'):
+            pass
+    except OSError:
+        pass  # Cache is best-effort; the check just runs again next time
+
+def walk_ir_files(path):
+    """
+    Yield full paths of .ir files under path using os.scandir, which reuses
+    the directory entry's cached type info instead of re-stat'ing.
+    """
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from walk_ir_files(entry.path)
+                elif entry.name.endswith(('.ir', '.IR', '.Ir', '.iR')):
+                    yield entry.path
+    except OSError as e:
+        logging.error(f"Error scanning directory '{path}': {e}")
 
 # ----------------------------
 # Flipper IR Decoder Class
 # ----------------------------
 
 class FlipperIRDecoder:
-    def __init__(self, system_dir, flipper_dir, parsed_dir, port, log_level, log_file, close_apps_frequency=10):
+    def __init__(self, system_dir, flipper_dir, parsed_dir, port, log_level, log_file, close_apps_frequency=10, verify_output=False):
         self.system_dir = system_dir
         self.flipper_dir = flipper_dir
         self.parsed_dir = parsed_dir
@@ -48,6 +84,8 @@ class FlipperIRDecoder:
         self.setup_logging(log_level, log_file)
         self.serial_conn = None
         self.close_apps_frequency = close_apps_frequency
+        self.verify_output = verify_output
+        self.created_dirs = set()
 
     def setup_logging(self, log_level, log_file):
         """
@@ -81,21 +119,17 @@ class FlipperIRDecoder:
 
     def send_command(self, command, timeout=2):
         """
-        Send a command to Flipper Zero and return the response with a shorter timeout.
+        Send a command to Flipper Zero and return the response, blocking on
+        the serial read until the CLI prompt arrives instead of sleep-polling.
         """
         try:
+            self.serial_conn.timeout = timeout
             self.serial_conn.write(f"{command}\r\n".encode('ascii'))
-            
-            start_time = time.time()
-            response = ""
-            while time.time() - start_time < timeout:
-                if self.serial_conn.in_waiting:
-                    chunk = self.serial_conn.read(self.serial_conn.in_waiting).decode('ascii', errors='ignore')
-                    response += chunk
-                    if '\n' in chunk:  # Check for newline to indicate end of response
-                        break
-                time.sleep(0.05)  # Short sleep to prevent CPU hogging
-            
+
+            raw = self.serial_conn.read_until(b'>: ', size=65536)
+            response = raw.decode('ascii', errors='ignore')
+            if response.endswith('>: '):
+                response = response[:-3]
             response = response.strip()
             
             # Filter out unwanted responses
@@ -112,6 +146,36 @@ class FlipperIRDecoder:
             return None
 
 
+    def send_command_batch(self, commands, timeout=5):
+        """
+        Write several commands in a single serial write, then read until the
+        CLI prompt has been seen once per command. Returns a list of responses
+        in command order, or None if the combined response could not be parsed.
+        """
+        try:
+            payload = b''.join(f"{command}\r\n".encode('ascii') for command in commands)
+            self.serial_conn.write(payload)
+
+            deadline = time.time() + timeout
+            buffer = ""
+            while buffer.count('>: ') < len(commands) and time.time() < deadline:
+                self.serial_conn.timeout = max(0.05, deadline - time.time())
+                chunk = self.serial_conn.read_until(b'>: ', size=65536)
+                if not chunk:
+                    break
+                buffer += chunk.decode('ascii', errors='ignore')
+
+            parts = buffer.split('>: ')
+            # N prompts split into N+1 parts; anything less means at least
+            # one response is missing its terminating prompt
+            if len(parts) <= len(commands):
+                logging.warning(f"Batched response incomplete: expected {len(commands)} prompts, got {len(parts) - 1}")
+                return None
+            return [part.strip() for part in parts[:len(commands)]]
+        except Exception as e:
+            logging.error(f"Failed to send command batch: {e}")
+            return None
+
     def send_command_with_retry(self, command, max_retries=3, timeout=2):
         """
         Send a command with retry mechanism and configurable timeout.
@@ -127,15 +191,22 @@ class FlipperIRDecoder:
 
     def create_directory(self, path):
         """
-        Create a directory on Flipper Zero if it doesn't exist.
+        Create a directory on Flipper Zero if it doesn't exist, skipping
+        components already created during this session.
         """
+        if path in self.created_dirs:
+            return True
         components = path.strip('/').split('/')
         for i in range(1, len(components) + 1):
             current_path = '/' + '/'.join(components[:i])
+            if current_path in self.created_dirs:
+                continue
             response = self.send_command_with_retry(f"storage mkdir {current_path}")
             if response is None or ("Storage error:" in response and "already exists" not in response.lower()):
                 logging.error(f"Error creating directory '{current_path}': {response}")
                 return False
+            self.created_dirs.add(current_path)
+        self.created_dirs.add(path)
         return True
 
     def close_running_apps(self):
@@ -162,29 +233,37 @@ class FlipperIRDecoder:
 
     def check_type_raw(self, irfile):
         """
-        Check if the IR file is of type 'raw'.
+        Check if the IR file is of type 'raw' by scanning its header bytes.
         """
-        content = self.read_file_content(irfile)
-        if content is None:
+        try:
+            with open(irfile, 'rb') as f:
+                header = f.read(1024).lower()
+        except OSError as e:
+            logging.error(f"Unable to read file '{irfile}': {e}")
             return False
-        
-        # Convert content to lowercase and remove whitespace
-        cleaned_content = ''.join(content.lower().split())
-        
-        # Check for various possible raw type indicators
-        raw_indicators = ['type:raw', 'type="raw"', "type='raw'"]
-        return any(indicator in cleaned_content for indicator in raw_indicators)
+        # Files without a 'type:' line in the first 1KB are not well-formed
+        # Flipper IR files anyway.
+        return (b'type: raw' in header or b'type:raw' in header
+                or b'type:"raw"' in header or b"type:'raw'" in header)
 
     def gather_ir_files(self):
+        """
+        Scan the system directory for raw IR files, checking files in parallel
+        since the work is I/O-bound on many small files.
+        """
         ir_files = []
-        for subdir, _, files in os.walk(self.system_dir):
-            for file in files:
-                if file.lower().endswith(".ir"):
-                    full_path = os.path.join(subdir, file)
-                    if self.check_type_raw(full_path):
-                        relative_path = os.path.relpath(subdir, self.system_dir).replace("\\", "/")
-                        ir_files.append((relative_path, file))
-                        logging.debug(f"Raw IR file found: {full_path}")  # Add this line
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            futures = {
+                executor.submit(self.check_type_raw, full_path): full_path
+                for full_path in walk_ir_files(self.system_dir)
+            }
+            for future in as_completed(futures):
+                full_path = futures[future]
+                if future.result():
+                    subdir = os.path.dirname(full_path)
+                    relative_path = os.path.relpath(subdir, self.system_dir).replace("\\", "/")
+                    ir_files.append((relative_path, os.path.basename(full_path)))
+                    logging.debug(f"Raw IR file found: {full_path}")
         return ir_files
 
     def verify_file_exists(self, file_path, timeout=0.5):
@@ -212,12 +291,23 @@ class FlipperIRDecoder:
         # Decode the IR file with a shorter timeout
         decode_command = f"ir decode {input_file} {output_file}"
         response = self.send_command_with_retry(decode_command, timeout=1)
+        return self.record_decode_result(input_file, output_file, response)
 
+    def record_decode_result(self, input_file, output_file, response):
+        """
+        Check a decode response and verify the output file, updating counters.
+        """
         if response is None or "Error" in response or "Failed" in response:
             logging.error(f"Failed to decode '{input_file}'. Response: {response}")
             self.failed_files.append(input_file)
             return False
 
+        # Trust the decode response unless verification was requested;
+        # the storage info round-trip doubles serial traffic per file
+        if not self.verify_output:
+            self.processed_count += 1
+            return True
+
         # Verify the file was created (with a short timeout)
         if self.verify_file_exists(output_file, timeout=0.5):
             self.processed_count += 1
@@ -227,10 +317,43 @@ class FlipperIRDecoder:
             self.failed_files.append(input_file)
             return False
 
+    def decode_ir_batch(self, batch):
+        """
+        Decode a batch of IR files with a single serial round-trip, falling
+        back to per-file commands if the batched response cannot be parsed.
+        """
+        jobs = []
+        for relative_path, ir_file in batch:
+            input_file = f"{self.flipper_dir}{relative_path}/{ir_file}".replace("\\", "/")
+            output_file = f"{self.parsed_dir}{relative_path}/{ir_file}".replace("\\", "/")
+
+            output_dir = os.path.dirname(output_file)
+            if not self.create_directory(output_dir):
+                logging.error(f"Failed to create directory for '{output_file}'")
+                self.failed_files.append(input_file)
+                continue
+            jobs.append((input_file, output_file))
 
-    def process_ir_files(self, ir_files):
+        if not jobs:
+            return
+
+        responses = self.send_command_batch(
+            [f"ir decode {input_file} {output_file}" for input_file, output_file in jobs]
+        )
+        if responses is None:
+            logging.warning("Batched decode failed; retrying files individually")
+            for input_file, output_file in jobs:
+                response = self.send_command_with_retry(f"ir decode {input_file} {output_file}", timeout=1)
+                self.record_decode_result(input_file, output_file, response)
+            return
+
+        for (input_file, output_file), response in zip(jobs, responses):
+            self.record_decode_result(input_file, output_file, response)
+
+    def process_ir_files(self, ir_files, batch_size=8):
         """
-        Process all gathered IR files with a progress bar and less frequent app closing.
+        Process all gathered IR files in batches with a progress bar and less
+        frequent app closing.
         """
         total_files = len(ir_files)
         if total_files == 0:
@@ -238,14 +361,18 @@ class FlipperIRDecoder:
             return
 
         logging.info(f"{total_files} files to process. Starting...")
+        files_since_close = self.close_apps_frequency  # Close apps before the first batch
         with tqdm(total=total_files, desc="Decoding IR Files", unit="file") as pbar:
-            for index, (relative_path, ir_file) in enumerate(ir_files, 1):
-                if index % self.close_apps_frequency == 1:
+            for start in range(0, total_files, batch_size):
+                batch = ir_files[start:start + batch_size]
+                if files_since_close >= self.close_apps_frequency:
                     self.close_running_apps()
-                    logging.debug(f"Closed running apps before processing file {index}")
-                
-                self.decode_ir_file(relative_path, ir_file)
-                pbar.update(1)
+                    logging.debug(f"Closed running apps before processing file {start + 1}")
+                    files_since_close = 0
+
+                self.decode_ir_batch(batch)
+                files_since_close += len(batch)
+                pbar.update(len(batch))
 
         logging.info(f"Finished. {self.processed_count} out of {total_files} files processed successfully.")
         if self.failed_files:
@@ -288,15 +415,9 @@ def main():
     # Define required packages
     required_packages = ['serial', 'tqdm', 'colorama']
 
-    # Check and install dependencies
+    # Check and install dependencies (already imported at module top)
     check_and_install_dependencies(required_packages)
 
-    # Import after ensuring dependencies are installed
-    import serial
-    import time
-    import logging
-    from tqdm import tqdm
-
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description="Decode IR files on Flipper Zero.")
     parser.add_argument(
@@ -343,6 +464,11 @@ def main():
     default=50,
     help='Frequency of closing running apps (every N files).'
     )
+    parser.add_argument(
+        '--verify-output',
+        action='store_true',
+        help='Verify each decoded file with storage info (doubles serial traffic).'
+    )
     args = parser.parse_args()
 
     # Initialize and run the decoder
@@ -353,7 +479,8 @@ def main():
         port=args.port,
         log_level=args.log_level,
         log_file=args.log_file,
-        close_apps_frequency=args.close_apps_frequency
+        close_apps_frequency=args.close_apps_frequency,
+        verify_output=args.verify_output
     )
     decoder.run()
 
@@ -2,9 +2,13 @@ import os
 import sys
 import subprocess
 import importlib.util
+import hashlib
+import heapq
+import itertools
+import mmap
+import threading
 import traceback
 import time
-import gc
 import re
 import json
 
@@ -12,124 +16,252 @@ def install_package(package):
     subprocess.check_call([sys.executable, "-m", "pip", "install", package])
 
 def ensure_package(package):
+    # Skip the sys.path scan when the package was already verified by a
+    # previous run (or the user opted out via FLIPPER_SKIP_DEPS=1)
+    if os.environ.get("FLIPPER_SKIP_DEPS") == "1":
+        return
+    cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "flipper-scripts")
+    sentinel = os.path.join(cache_dir, f"deps-ok-{package}")
+    if os.path.exists(sentinel):
+        return
     if importlib.util.find_spec(package) is None:
         print(f"{package} not found. Installing...")
         install_package(package)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(sentinel, "w"):
+            pass
+    except OSError:
+        pass  # Cache is best-effort; the check just runs again next time
 
 # Ensure required packages are installed
 ensure_package("tqdm")
 
 import difflib
 import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 import logging
 
-# Set up logging
-logging.basicConfig(filename='ir_comparison_debug.log', level=logging.DEBUG,
+# Set up logging. INFO by default: per-file DEBUG records cost a format and
+# a file write each across the whole IRDB, so they are opt-in via --debug
+logging.basicConfig(filename='ir_comparison_debug.log', level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Precompiled line-classification helpers shared by the cleaner's hot loops.
+# Header lines are `Key: value`; hashing the key into a frozenset is one
+# lookup regardless of how many header fields get added
+HEADER_FIELD_KEYS = frozenset({'Filetype', 'Version'})
+
+def is_header_line(stripped):
+    """True for '#' comment lines and Filetype/Version header fields."""
+    return stripped.startswith('#') or stripped.partition(':')[0] in HEADER_FIELD_KEYS
+
+# Content-addressed cache of signal line-lists; identical signals repeat
+# heavily across brand/model files, so reusing one list per unique body
+# cuts allocations and memory. Each worker process keeps its own copy.
+_signal_cache = {}
+
+def cache_signal_lines(signal):
+    """Return the canonical list for this signal body, caching new ones."""
+    key = tuple(signal)
+    cached = _signal_cache.get(key)
+    if cached is None:
+        _signal_cache[key] = signal
+        return signal
+    return cached
+
+# Reuse one SequenceMatcher per worker instead of allocating one per file
+_matcher_local = threading.local()
+
+def get_sequence_matcher():
+    matcher = getattr(_matcher_local, 'matcher', None)
+    if matcher is None:
+        matcher = difflib.SequenceMatcher(None)
+        _matcher_local.matcher = matcher
+    return matcher
+
+
+# Files at or above this size are memory-mapped instead of read() whole
+MMAP_THRESHOLD = 1 << 20
 
 def read_file(file_path):
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
-            return file.read().splitlines()
+        # 256K buffer: fewer read syscalls than the 8K default, which adds
+        # up when the tree sits on a network mount
+        with open(file_path, 'rb', buffering=262144) as file:
+            if os.fstat(file.fileno()).st_size >= MMAP_THRESHOLD:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    data = bytes(mapped)
+            else:
+                data = file.read()
+        # Decode once at the end; most files are pure ASCII
+        return data.decode('utf-8', errors='replace').splitlines()
     except Exception as e:
         logging.error(f"Error reading file {file_path}: {str(e)}")
         return None
 
 def write_file(file_path, content):
     try:
-        with open(file_path, 'w', encoding='utf-8', newline='\n') as file:
-            file.write('\n'.join(content))
+        # Encode once and issue a single kernel write, skipping the
+        # TextIOWrapper re-encode/chunking on the hot path
+        data = '\n'.join(content).encode('utf-8')
+        with open(file_path, 'wb') as file:
+            file.write(data)
         return True
     except Exception as e:
         logging.error(f"Error writing file {file_path}: {str(e)}")
         return False
 
-def normalize_button_names(all_signals, mapping, file_path):
-    # Normalize file_path to use forward slashes
-    file_path = file_path.replace('\\', '/')
-
-    # Load group patterns
+# Compiled name-check index, built once per process from the static mapping
+# (see init_worker); None while normalization is disabled
+_name_check_index = None
+# Merged button maps keyed by the tuple of matching category ids, so files in
+# the same category combination share one merge
+_category_merge_cache = {}
+
+def _fuse_name_patterns(patterns):
+    """
+    Collapse a resolved pattern list into (combined_regex, exact_names):
+    one alternation match call per standard name instead of a scan over
+    the individual patterns. Each branch keeps its own anchors.
+    """
+    regex_parts = []
+    exact = set()
+    for pattern in patterns:
+        if isinstance(pattern, re.Pattern):
+            regex_parts.append(f'(?:{pattern.pattern})')
+        else:
+            exact.add(pattern.strip())
+    combined = re.compile('|'.join(regex_parts), re.IGNORECASE) if regex_parts else None
+    return combined, frozenset(exact)
+
+def _compile_name_patterns(patterns, group_patterns):
+    """Resolve $group references and compile /regex/ entries; exact matches
+    are kept as lowercased strings."""
+    compiled_patterns = []
+    for pattern in patterns:
+        if group_patterns is not None and pattern.startswith('$group:'):
+            compiled_patterns.extend(group_patterns.get(pattern[len('$group:'):], []))
+        elif pattern.startswith('/') and pattern.endswith('/'):
+            compiled_patterns.append(re.compile(pattern[1:-1], re.IGNORECASE))
+        else:
+            compiled_patterns.append(pattern.lower())
+    return compiled_patterns
+
+def build_name_check_index(mapping):
+    """
+    Compile the static name-check mapping once per process: every group
+    reference resolved, every regex compiled, and one matcher per category
+    pattern. The mapping never changes between files, so none of this
+    belongs in the per-file path.
+    """
     name_check = mapping.get('name-check', {})
-    groups = name_check.get('$groups', {})
-    # Build compiled regex patterns for groups
-    group_patterns = {}
-    for group_name, patterns in groups.items():
-        compiled_patterns = []
-        for pattern in patterns:
-            if pattern.startswith('/') and pattern.endswith('/'):
-                regex = pattern[1:-1]
-                compiled_patterns.append(re.compile(regex, re.IGNORECASE))
-            else:
-                # Exact match
-                compiled_patterns.append(pattern.lower())
-        group_patterns[group_name] = compiled_patterns
+    group_patterns = {
+        group_name: _compile_name_patterns(patterns, None)
+        for group_name, patterns in name_check.get('$groups', {}).items()
+    }
 
-    # Build mapping for the file category
-    category_mappings = {}
+    index = []
     for category_pattern, buttons in name_check.items():
         if category_pattern.startswith('$'):
             continue  # Skip special keys
-
+        # Standard names are stripped here so the rename path can use them as-is
+        resolved = {
+            standard_name.strip(): _compile_name_patterns(patterns, group_patterns)
+            for standard_name, patterns in buttons.items()
+        }
         # Handle multiple categories separated by commas
-        category_patterns = category_pattern.split(',')
-        for cat_pattern in category_patterns:
+        for cat_pattern in category_pattern.split(','):
             cat_pattern = cat_pattern.strip()
-            # Convert wildcard pattern to regex
-            cat_regex = cat_pattern.replace('*', '.*')
-            cat_regex = f"^{cat_regex}$"
-            category_matcher = re.compile(cat_regex, re.IGNORECASE)
-            if category_matcher.match(file_path):
-                logging.debug(f"File '{file_path}' matches category pattern '{cat_pattern}'")
-                # Found matching category, merge buttons
-                for standard_name, patterns in buttons.items():
-                    compiled_patterns = []
-                    for pattern in patterns:
-                        if pattern.startswith('$group:'):
-                            group_name = pattern[len('$group:'):]
-                            compiled_patterns.extend(group_patterns.get(group_name, []))
-                        elif pattern.startswith('/') and pattern.endswith('/'):
-                            regex = pattern[1:-1]
-                            compiled_patterns.append(re.compile(regex, re.IGNORECASE))
-                        else:
-                            compiled_patterns.append(pattern.lower())
-                    if standard_name in category_mappings:
-                        category_mappings[standard_name].extend(compiled_patterns)
-                    else:
-                        category_mappings[standard_name] = compiled_patterns
-
-    buttons_renamed = 0  # Counter for buttons renamed
-
-    # Normalize button names
-    for entry in all_signals:
-        original_name = entry['name'].strip()
-        new_name = original_name  # Default to original name
-        for standard_name, patterns in category_mappings.items():
-            for pattern in patterns:
-                if isinstance(pattern, re.Pattern):
-                    if pattern.match(original_name):
-                        new_name = standard_name
-                        break
+            if cat_pattern.endswith('/*') and not any(ch in cat_pattern[:-2] for ch in '*?['):
+                # 'Dir/*' is just a top-level-directory check; match it with
+                # a string compare instead of a regex
+                index.append((None, cat_pattern[:-2].lower(), resolved))
+            else:
+                # Convert wildcard pattern to regex
+                cat_regex = f"^{cat_pattern.replace('*', '.*')}$"
+                index.append((re.compile(cat_regex, re.IGNORECASE), None, resolved))
+    return index
+
+def build_category_mappings(file_path):
+    """
+    Merge the button maps of every indexed category whose pattern matches
+    this file's path. Per-file cost is the category matches plus one cache
+    lookup; the merge itself runs once per category combination.
+    """
+    # Normalize file_path to use forward slashes
+    file_path = file_path.replace('\\', '/')
+    top = file_path.split('/', 1)[0].lower() if '/' in file_path else None
+    matched = tuple(
+        i for i, (matcher, prefix, _buttons) in enumerate(_name_check_index)
+        if (prefix == top if matcher is None else matcher.match(file_path))
+    )
+    cached = _category_merge_cache.get(matched)
+    if cached is None:
+        merged = {}
+        for i in matched:
+            for standard_name, patterns in _name_check_index[i][2].items():
+                if standard_name in merged:
+                    # Concatenate rather than extend: the index lists are shared
+                    merged[standard_name] = merged[standard_name] + patterns
                 else:
-                    # Exact match
-                    if original_name.lower() == pattern.strip():
-                        new_name = standard_name
-                        break
-            if new_name != original_name:
-                logging.debug(f"Renaming button '{original_name}' to '{new_name}'")
-                buttons_renamed += 1
-                break  # Found a matching standard name
-        # Update the name in the signal
-        entry['name'] = new_name.strip()
-        entry['signal'][0] = f'name: {entry["name"]}'
-    return buttons_renamed
+                    merged[standard_name] = patterns
+        # Literal patterns collapse into one name->standard dict consulted
+        # before any regex runs; regex alternations stay per standard name
+        category_mappings = {}
+        literal_map = {}
+        for standard_name, patterns in merged.items():
+            combined, exact = _fuse_name_patterns(patterns)
+            category_mappings[standard_name] = combined
+            for literal in exact:
+                literal_map.setdefault(literal, standard_name)
+        # The empty dict memoizes classification results for this category
+        # combination: IRDB reuses the same few dozen button names across
+        # thousands of files, so it converges to pure dict hits
+        cached = (category_mappings, literal_map, {})
+        _category_merge_cache[matched] = cached
+    return cached
+
+def normalize_signal_name(name, signal, category_mappings, literal_map, classify_cache):
+    """
+    Return the standard button name for this signal if a category pattern
+    matches, rewriting the signal's name line to the normalized form.
+    Classification is memoized on the lowercased name (all patterns match
+    case-insensitively), so the regex scan runs once per distinct name.
+    """
+    original_name = name.strip()
+    name_lower = original_name.lower()
+    if name_lower in classify_cache:
+        standard = classify_cache[name_lower]
+    else:
+        # Literal names ("mute", "mte", ...) resolve with one dict lookup;
+        # the regex alternations only run on a miss
+        standard = literal_map.get(name_lower)  # None caches "no pattern matched"
+        if standard is None:
+            for standard_name, combined in category_mappings.items():
+                if combined is not None and combined.match(original_name):
+                    standard = standard_name
+                    logging.debug("Renaming button '%s' to '%s'", original_name, standard)
+                    break  # Found a matching standard name
+        classify_cache[name_lower] = standard
+    if standard is None or standard == original_name:
+        # Nothing to rename; leave the name line untouched
+        return original_name
+    # Update the name in the signal
+    signal[0] = 'name: ' + standard
+    return standard
+
+def clean_and_deduplicate(original_content, decoded_content, normalize=False, file_path=''):
+    # Strip each line exactly once; every later loop consumes (raw, stripped)
+    original_pairs = [(line, line.strip()) for line in original_content]
+    decoded_pairs = [(line, line.strip()) for line in decoded_content]
 
-def clean_and_deduplicate(original_content, decoded_content, normalize=False, mapping=None, file_path=''):
     # Extract initial content (headers and initial comments) from original_content
     initial_content = []
-    for line in original_content:
-        if line.strip().startswith('#') or line.strip().startswith('Filetype:') or line.strip().startswith('Version:'):
+    for line, stripped in original_pairs:
+        if is_header_line(stripped):
             initial_content.append(line)
         else:
             break
@@ -141,136 +273,189 @@ def clean_and_deduplicate(original_content, decoded_content, normalize=False, ma
         initial_content.append('#')
 
     # Remove headers from decoded_content
-    decoded_content_no_headers = []
+    decoded_pairs_no_headers = []
     skip_headers = True
-    for line in decoded_content:
+    for pair in decoded_pairs:
         if skip_headers:
-            if line.strip().startswith('#') or line.strip().startswith('Filetype:') or line.strip().startswith('Version:'):
+            if is_header_line(pair[1]):
                 continue  # Skip header lines
-            else:
-                skip_headers = False
-                decoded_content_no_headers.append(line)
+            skip_headers = False
+        decoded_pairs_no_headers.append(pair)
+
+    # Look up the category's precompiled name mappings (built per process)
+    if normalize and _name_check_index is not None:
+        category_mappings, literal_map, classify_cache = build_category_mappings(file_path)
+    else:
+        category_mappings = literal_map = classify_cache = None
+
+    # Collect signals directly into a name-keyed dict of
+    # (signal_lines, comments) tuples: duplicate lookups are O(1) and there
+    # is no per-signal dict allocation. Decoded signals are parsed first, so
+    # first-seen-wins is exactly "decoded beats original"
+    unique_signals = {}
+    duplicates_removed = 0
+    buttons_renamed = 0
+
+    def add_signal(name_value, comments, signal):
+        nonlocal duplicates_removed, buttons_renamed
+        if category_mappings is not None:
+            new_name = normalize_signal_name(name_value, signal, category_mappings, literal_map, classify_cache)
+            if new_name != name_value:
+                buttons_renamed += 1
+            name_value = new_name
+        # Share one list per unique signal body across files (post-rename,
+        # since renaming rewrites the name line)
+        signal = cache_signal_lines(signal)
+        # The same few button names recur across the whole corpus; interning
+        # dedups the key storage and lets dict probes hit pointer equality
+        name_value = sys.intern(name_value)
+        if name_value not in unique_signals:
+            unique_signals[name_value] = (signal, comments)
         else:
-            decoded_content_no_headers.append(line)
+            # Duplicate found, increment counter
+            duplicates_removed += 1
 
-    # Process content to collect signals, keeping track of source and names
-    all_signals = []
     # Process decoded_content first to prefer decoded signals
-    for content, source in [
-        (decoded_content_no_headers, 'decoded'),
-        (original_content[len(initial_content):], 'original')
-    ]:
+    for content in (decoded_pairs_no_headers, original_pairs[len(initial_content):]):
         current_signal = []
         current_comments = []
         current_signal_name = ''
-        for line in content + ['#']:  # Add '#' to ensure the last signal is processed
-            line = line.rstrip('\n')
-            name_match = re.match(r'^name\s*:\s*(.*)$', line.strip(), re.IGNORECASE)
-            if name_match:
-                # Start of a new signal
-                if current_signal and current_signal_name:
-                    # Append the previous signal to all_signals
-                    name_value = current_signal_name.strip()
-                    all_signals.append({
-                        'name': name_value,
-                        'comments': current_comments.copy(),
-                        'signal': current_signal.copy(),
-                        'source': source
-                    })
-                    current_signal.clear()
-                    current_comments.clear()
-                current_signal.append(line)
-                current_signal_name = name_match.group(1).strip()
-            elif line.strip().startswith('#'):
+        # While True, the current signal's name is already taken and its body
+        # lines are discarded without being collected
+        skipping = False
+        # Bind hot attributes to locals (re-bound whenever a list is handed off)
+        signal_append = current_signal.append
+        comment_append = current_comments.append
+        for line, stripped in itertools.chain(content, (('#', '#'),)):  # Sentinel flushes the last signal
+            if not stripped:
+                # Skip empty lines
+                continue
+            if stripped[0] == '#':
                 # Comment line
-                if current_signal and current_signal_name:
-                    # Append the previous signal before the comment
-                    name_value = current_signal_name.strip()
-                    all_signals.append({
-                        'name': name_value,
-                        'comments': current_comments.copy(),
-                        'signal': current_signal.copy(),
-                        'source': source
-                    })
-                    current_signal.clear()
+                if skipping:
+                    skipping = False
+                elif current_signal and current_signal_name:
+                    # Hand the signal list to add_signal and start a fresh one;
+                    # comments keep accumulating here, so they must be copied
+                    add_signal(current_signal_name.strip(), current_comments.copy(),
+                               current_signal)
+                    current_signal = []
+                    signal_append = current_signal.append
                     current_signal_name = ''
-                current_comments.append(line)
-            elif line.strip() == '':
-                # Skip empty lines
+                comment_append(line)
                 continue
-            else:
-                current_signal.append(line)
-        if current_signal and current_signal_name:
-            # Append the last signal
-            name_value = current_signal_name.strip()
-            all_signals.append({
-                'name': name_value,
-                'comments': current_comments.copy(),
-                'signal': current_signal.copy(),
-                'source': source
-            })
-
-    # Normalize button names if requested
-    if normalize and mapping:
-        buttons_renamed = normalize_button_names(all_signals, mapping, file_path)
-    else:
-        buttons_renamed = 0
-
-    # Deduplicate signals based on 'name', preferring decoded signals
-    unique_signals = {}
-    duplicates_removed = 0
-    for entry in all_signals:
-        name = entry['name']
-        source = entry['source']
-        if name not in unique_signals:
-            unique_signals[name] = entry
-        else:
-            existing_entry = unique_signals[name]
-            if existing_entry['source'] == 'original' and source == 'decoded':
-                # Replace original signal with decoded one
-                unique_signals[name] = entry
-                duplicates_removed += 1
-            else:
-                # Duplicate found, increment counter
-                duplicates_removed += 1
+            # Name-line check with str ops instead of a regex: 'name',
+            # optional whitespace, ':' (case-insensitive, like the old
+            # ^name\s*:\s*(.*)$ pattern)
+            is_name = False
+            if stripped[:4].lower() == 'name':
+                key, sep, rest = stripped.partition(':')
+                if sep and not key[4:].strip():
+                    is_name = True
+            if is_name:
+                # Start of a new signal
+                if skipping:
+                    # The skipped duplicate ran straight into the next name,
+                    # so its pending comments were consumed along with it
+                    skipping = False
+                    current_comments = []
+                    comment_append = current_comments.append
+                elif current_signal and current_signal_name:
+                    # Both lists transfer ownership to add_signal — no copies
+                    add_signal(current_signal_name.strip(), current_comments,
+                               current_signal)
+                    current_signal = []
+                    current_comments = []
+                    signal_append = current_signal.append
+                    comment_append = current_comments.append
+                name_value = rest.strip()
+                if category_mappings is None and name_value in unique_signals:
+                    # Early rejection: this name can never replace the entry
+                    # already stored, so don't bother collecting its lines.
+                    # (With --normalize the key is only known post-rename,
+                    # so the full path runs.)
+                    duplicates_removed += 1
+                    current_signal_name = ''
+                    # Drop any orphan body lines collected before this name —
+                    # the baseline attached them to the rejected duplicate
+                    current_signal = []
+                    signal_append = current_signal.append
+                    skipping = True
+                    continue
+                signal_append(line)
+                current_signal_name = name_value
+            elif not skipping:
+                signal_append(line)
+
+    # Rebuild the cleaned content, tracking whether the last emitted line is
+    # a lone '#' so consecutive separators are collapsed as we go instead of
+    # in a separate normalization pass
+    cleaned_content = []
+    ends_with_hash = False
+
+    def append_collapsed(line, stripped):
+        nonlocal ends_with_hash
+        is_hash = stripped == '#'
+        if is_hash and ends_with_hash:
+            return
+        cleaned_content.append(line)
+        ends_with_hash = is_hash
+
+    for line in initial_content:
+        append_collapsed(line, line.strip())
 
-    # Rebuild the cleaned content
-    cleaned_content = initial_content.copy()
     comments_readded = 0
-    for entry in unique_signals.values():
-        comments = entry['comments']
-        signal = entry['signal']
+    for signal, comments in unique_signals.values():
         # Add comments if present
-        if comments and (not cleaned_content or cleaned_content[-1].strip() != '#'):
-            cleaned_content.extend(comments)
+        if comments and (not cleaned_content or not ends_with_hash):
+            for comment in comments:
+                append_collapsed(comment, comment.strip())
             comments_readded += len(comments)
-        # Add signal
+        # Add signal (signal lines are never lone '#'; those parse as comments)
         cleaned_content.extend(signal)
+        ends_with_hash = False
         # Ensure there's a '#' between signals for proper formatting
-        if cleaned_content and cleaned_content[-1].strip() != '#':
-            cleaned_content.append('#')
+        cleaned_content.append('#')
+        ends_with_hash = True
 
     # Remove any empty lines or extra '#' at the end of the file
     while cleaned_content and cleaned_content[-1].strip() in ('', '#'):
         cleaned_content.pop()
 
-    # Normalize cleaned content to avoid multiple '#' lines
-    normalized_cleaned_content = []
-    prev_line_was_hash = False
-    for line in cleaned_content:
-        if line.strip() == '#':
-            if not prev_line_was_hash:
-                normalized_cleaned_content.append('#')
-            prev_line_was_hash = True
-        else:
-            normalized_cleaned_content.append(line)
-            prev_line_was_hash = False
-    cleaned_content = normalized_cleaned_content
-
     return cleaned_content, duplicates_removed, buttons_renamed, comments_readded
 
-def compare_files(original_file, decoded_file, normalize=False, mapping=None, relative_path=''):
+def files_identical(path_a, path_b):
+    """
+    Cheap byte-identity check: compare sizes first, then streaming BLAKE2b
+    hashes over 64KB chunks.
+    """
     try:
+        if os.path.getsize(path_a) != os.path.getsize(path_b):
+            return False
+        digests = []
+        for path in (path_a, path_b):
+            digest = hashlib.blake2b()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    digest.update(chunk)
+            digests.append(digest.digest())
+        return digests[0] == digests[1]
+    except OSError:
+        return False
+
+def compare_files(original_file, decoded_file, normalize=False, relative_path='', exact_ratio=False):
+    try:
+        # Byte-identical pairs (idempotent re-runs) need no cleaning or diffing
+        if files_identical(original_file, decoded_file):
+            return {
+                'difference_ratio': 0.0,
+                'lost_comments': 0,
+                'duplicates_removed': 0,
+                'buttons_renamed': 0,
+                'comments_readded': 0,
+                'diff_summary': 'Added: 0, Removed: 0'
+            }
+
         original_content = read_file(original_file)
         decoded_content = read_file(decoded_file)
 
@@ -282,49 +467,139 @@ def compare_files(original_file, decoded_file, normalize=False, mapping=None, re
             original_content,
             decoded_content,
             normalize,
-            mapping,
             relative_path  # Pass the relative path to determine category
         )
 
-        # Write the cleaned content back to the decoded file
-        if not write_file(decoded_file, cleaned_content):
-            logging.error(f"Failed to write cleaned content to {decoded_file}")
-            return None
+        # Write the cleaned content back only when it differs from what is
+        # already on disk; most decoded files come out of cleaning unchanged
+        # and rewriting them is pure write amplification
+        if cleaned_content != decoded_content:
+            if not write_file(decoded_file, cleaned_content):
+                logging.error(f"Failed to write cleaned content to {decoded_file}")
+                return None
+
+        # No-op cleans need no diffing at all; list == has an early exit
+        # on the first mismatching line
+        if original_content == cleaned_content:
+            return {
+                'difference_ratio': 0.0,
+                'lost_comments': 0,
+                'duplicates_removed': duplicates_removed,
+                'buttons_renamed': buttons_renamed,
+                'comments_readded': comments_readded,
+                'diff_summary': 'Added: 0, Removed: 0'
+            }
 
-        # Compare original content with cleaned content
-        differ = difflib.Differ()
-        diff = list(differ.compare(original_content, cleaned_content))
+        # Count added/removed lines with multiset difference instead of
+        # running a full O(N*M) Differ pass just to summarize
+        original_counts = Counter(original_content)
+        cleaned_counts = Counter(cleaned_content)
+        added = sum((cleaned_counts - original_counts).values())
+        removed = sum((original_counts - cleaned_counts).values())
 
         # Calculate difference ratio
-        similarity = difflib.SequenceMatcher(None, '\n'.join(original_content), '\n'.join(cleaned_content)).ratio()
+        if exact_ratio:
+            # Match on lines, not characters — SequenceMatcher accepts any
+            # sequence of hashables, so no need to rejoin into giant strings
+            matcher = get_sequence_matcher()
+            matcher.set_seqs(original_content, cleaned_content)
+            similarity = matcher.ratio()
+        else:
+            # O(N+M) multiplicity-weighted line overlap, reusing the Counters
+            # built for the added/removed summary. Same 2*M/T shape as
+            # SequenceMatcher.ratio but with hash ops instead of DP matching.
+            common = sum((original_counts & cleaned_counts).values())
+            total = len(original_content) + len(cleaned_content)
+            similarity = 2 * common / total if total else 1.0
         difference_ratio = 1 - similarity
 
-        # Check for lost comments
-        original_comments = [line for line in original_content if line.strip().startswith('#')]
-        cleaned_comments = [line for line in cleaned_content if line.strip().startswith('#')]
-        lost_comments = [comment for comment in original_comments if comment not in cleaned_comments]
+        # Check for lost comments: hashed set membership instead of a list
+        # scan per original comment
+        cleaned_comment_set = {line for line in cleaned_content if line.strip().startswith('#')}
+        lost_comments = sum(1 for line in original_content
+                            if line.strip().startswith('#') and line not in cleaned_comment_set)
 
         return {
             'difference_ratio': difference_ratio,
-            'lost_comments': len(lost_comments),
+            'lost_comments': lost_comments,
             'duplicates_removed': duplicates_removed,
             'buttons_renamed': buttons_renamed,
             'comments_readded': comments_readded,
-            'diff_summary': summarize_diff(diff)
+            'diff_summary': f"Added: {added}, Removed: {removed}"
         }
     except Exception as e:
         logging.error(f"Error comparing files {original_file} and {decoded_file}: {str(e)}")
         logging.error(traceback.format_exc())
         return None
 
-def summarize_diff(diff):
-    added = sum(1 for line in diff if line.startswith('+ '))
-    removed = sum(1 for line in diff if line.startswith('- '))
-    changed = sum(1 for line in diff if line.startswith('? '))
-    return f"Added: {added}, Removed: {removed}, Changed: {changed}"
-
-def analyze_directories(original_dir, decoded_dir, threshold=0.1, file_limit=None, normalize=False, mapping=None):
-    results = []
+def walk_ir_files(base_dir):
+    """
+    Yield full paths of .ir files under base_dir using os.scandir, which
+    reuses the directory entry's cached type info instead of re-stat'ing.
+    """
+    try:
+        with os.scandir(base_dir) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from walk_ir_files(entry.path)
+                elif entry.name.endswith('.ir'):
+                    yield entry.path
+    except OSError as e:
+        logging.error(f"Error scanning directory {base_dir}: {str(e)}")
+
+def collect_relative_ir_paths(base_dir):
+    """
+    Build the set of .ir paths under base_dir, relative to it, with one
+    recursive scandir pass (no per-file stat calls later).
+    """
+    # The prefix is fixed, so slicing beats os.path.relpath per file
+    prefix_len = len(os.path.join(base_dir, ''))
+    return {path[prefix_len:] for path in walk_ir_files(base_dir)}
+
+def init_worker(mapping=None, log_level=logging.INFO):
+    """
+    Pool-worker initializer: configure logging in the child so log output
+    still lands in the log file on platforms that spawn rather than fork,
+    and compile the name-check index once instead of pickling compiled
+    patterns with every task.
+    """
+    logging.basicConfig(filename='ir_comparison_debug.log', level=log_level,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    if mapping is not None:
+        global _name_check_index
+        _name_check_index = build_name_check_index(mapping)
+
+def compare_one(args):
+    """
+    Worker for the process pool: clean and compare one original/decoded pair.
+    Returns (relative_path, comparison_or_None, skipped).
+    """
+    original_file, decoded_file, relative_path, normalize, exact_ratio = args
+    try:
+        logging.debug("Processing file: %s", relative_path)
+        comparison = compare_files(original_file, decoded_file, normalize, relative_path, exact_ratio)
+        return relative_path, comparison, False
+    except Exception as e:
+        logging.error(f"Error processing file {relative_path}: {str(e)}")
+        logging.error(traceback.format_exc())
+        return relative_path, None, True
+
+# How many worst-offender files the console summary shows
+TOP_RESULTS = 10
+
+def write_result_block(out_file, result):
+    out_file.write(f"\nFile: {result['file']}\n")
+    out_file.write(f"Difference Ratio: {result['difference_ratio']:.2f}\n")
+    out_file.write(f"Duplicates Removed: {result['duplicates_removed']}\n")
+    out_file.write(f"Buttons Renamed: {result['buttons_renamed']}\n")
+    out_file.write(f"Comments Re-added: {result['comments_readded']}\n")
+    out_file.write(f"Lost Comments: {result['lost_comments']}\n")
+    out_file.write(f"Diff Summary: {result['diff_summary']}\n")
+
+def analyze_directories(original_dir, decoded_dir, threshold=0.1, file_limit=None, normalize=False, mapping=None, exact_ratio=False, output_file=None):
+    # Only the worst TOP_RESULTS files are kept in memory; everything else
+    # streams straight to output_file as it is produced
+    top_results = []
     skipped_files = []
     processed_files = 0
     total_duplicates_removed = 0
@@ -334,69 +609,82 @@ def analyze_directories(original_dir, decoded_dir, threshold=0.1, file_limit=Non
     total_buttons_renamed = 0
     total_comments_readded = 0
 
-    # Get total number of .ir files for progress bar
-    total_files = sum(1 for root, _, files in os.walk(original_dir) for file in files if file.endswith('.ir'))
-
-    with tqdm(total=total_files, desc="Analyzing files", unit="file") as pbar:
-        for root, _, files in os.walk(original_dir):
-            for file in files:
-                if file.endswith('.ir'):
-                    try:
-                        original_file = os.path.join(root, file)
-                        relative_path = os.path.relpath(original_file, original_dir)
-                        decoded_file = os.path.join(decoded_dir, relative_path)
-
-                        logging.debug(f"Processing file: {relative_path}")
-
-                        if os.path.exists(decoded_file):
-                            comparison = compare_files(original_file, decoded_file, normalize, mapping, relative_path)
-                            if comparison is not None:
-                                total_duplicates_removed += comparison['duplicates_removed']
-                                total_lost_comments += comparison['lost_comments']
-                                total_difference_ratio += comparison['difference_ratio']
-                                total_buttons_renamed += comparison['buttons_renamed']
-                                total_comments_readded += comparison['comments_readded']
-                                processed_files += 1
-
-                                if comparison['difference_ratio'] > threshold or comparison['lost_comments']:
-                                    results.append({
-                                        'file': relative_path,
-                                        'difference_ratio': comparison['difference_ratio'],
-                                        'lost_comments': comparison['lost_comments'],
-                                        'duplicates_removed': comparison['duplicates_removed'],
-                                        'buttons_renamed': comparison['buttons_renamed'],
-                                        'comments_readded': comparison['comments_readded'],
-                                        'diff_summary': comparison['diff_summary']
-                                    })
-                                    total_files_with_differences += 1
-                        else:
-                            skipped_files.append(relative_path)
-
-                        pbar.update(1)
-
-                        if file_limit and processed_files >= file_limit:
-                            logging.info(f"Reached file limit of {file_limit}. Stopping analysis.")
-                            return results, skipped_files, {
-                                'total_files_processed': processed_files,
-                                'total_duplicates_removed': total_duplicates_removed,
-                                'total_lost_comments': total_lost_comments,
-                                'total_difference_ratio': total_difference_ratio,
-                                'total_files_with_differences': total_files_with_differences,
-                                'total_buttons_renamed': total_buttons_renamed,
-                                'total_comments_readded': total_comments_readded
-                            }
-
-                        # Force garbage collection every 1000 files
-                        if processed_files % 1000 == 0:
-                            gc.collect()
-
-                    except Exception as e:
-                        logging.error(f"Error processing file {file}: {str(e)}")
-                        logging.error(traceback.format_exc())
+    # One scandir pass over the decoded tree replaces a stat call per file
+    decoded_set = collect_relative_ir_paths(decoded_dir)
+
+    # Gather the work list up front; the single walk also gives the progress total
+    tasks = []
+    prefix_len = len(os.path.join(original_dir, ''))
+    for original_file in walk_ir_files(original_dir):
+        relative_path = original_file[prefix_len:]
+        if relative_path not in decoded_set:
+            skipped_files.append(relative_path)
+            continue
+        decoded_file = os.path.join(decoded_dir, relative_path)
+        tasks.append((original_file, decoded_file, relative_path, normalize, exact_ratio))
+
+    if file_limit:
+        logging.info(f"Limiting analysis to the first {file_limit} files.")
+        tasks = tasks[:file_limit]
+
+    out_file = open(output_file, 'w', encoding='utf-8') if output_file else None
+    if out_file:
+        out_file.write("Files with significant differences:\n")
+
+    # Per-file comparisons are independent and CPU-heavy, so fan them out
+    # across cores and aggregate in the main process.
+    try:
+        with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=init_worker,
+                                 initargs=(mapping, logging.getLogger().getEffectiveLevel())) as executor:
+            with tqdm(total=len(tasks), desc="Analyzing files", unit="file") as pbar:
+                for relative_path, comparison, skipped in executor.map(compare_one, tasks, chunksize=32):
+                    pbar.update(1)
+                    if skipped:
                         skipped_files.append(relative_path)
-                        pbar.update(1)
+                        continue
+                    if comparison is None:
+                        continue
+
+                    total_duplicates_removed += comparison['duplicates_removed']
+                    total_lost_comments += comparison['lost_comments']
+                    total_difference_ratio += comparison['difference_ratio']
+                    total_buttons_renamed += comparison['buttons_renamed']
+                    total_comments_readded += comparison['comments_readded']
+                    processed_files += 1
+
+                    if comparison['difference_ratio'] > threshold or comparison['lost_comments']:
+                        result = {
+                            'file': relative_path,
+                            'difference_ratio': comparison['difference_ratio'],
+                            'lost_comments': comparison['lost_comments'],
+                            'duplicates_removed': comparison['duplicates_removed'],
+                            'buttons_renamed': comparison['buttons_renamed'],
+                            'comments_readded': comparison['comments_readded'],
+                            'diff_summary': comparison['diff_summary']
+                        }
+                        total_files_with_differences += 1
+                        if out_file:
+                            write_result_block(out_file, result)
+                        # Bounded heap of the worst offenders for the console
+                        # report (processed_files breaks ratio ties)
+                        item = (result['difference_ratio'], processed_files, result)
+                        if len(top_results) < TOP_RESULTS:
+                            heapq.heappush(top_results, item)
+                        else:
+                            heapq.heappushpop(top_results, item)
 
-    return results, skipped_files, {
+        if out_file:
+            if total_files_with_differences == 0:
+                out_file.write("No files with significant differences found.\n")
+            out_file.write("\nSkipped files:\n")
+            for skipped in skipped_files:
+                out_file.write(f" - {skipped}\n")
+    finally:
+        if out_file:
+            out_file.close()
+
+    top_results.sort(reverse=True)
+    return [result for _ratio, _seq, result in top_results], skipped_files, {
         'total_files_processed': processed_files,
         'total_duplicates_removed': total_duplicates_removed,
         'total_lost_comments': total_lost_comments,
@@ -499,7 +787,7 @@ def load_mapping():
     '''
     return json.loads(mapping_json)
 
-def main(original_dir, decoded_dir, threshold=0.1, output_file=None, file_limit=None, normalize=False):
+def main(original_dir, decoded_dir, threshold=0.1, output_file=None, file_limit=None, normalize=False, exact_ratio=False):
     # Load mapping if normalization is enabled
     if normalize:
         mapping = load_mapping()
@@ -517,7 +805,7 @@ def main(original_dir, decoded_dir, threshold=0.1, output_file=None, file_limit=
     logging.info("Starting analysis...")
 
     start_time = time.time()
-    results, skipped_files, totals = analyze_directories(original_dir, decoded_dir, threshold, file_limit, normalize, mapping)
+    top_results, skipped_files, totals = analyze_directories(original_dir, decoded_dir, threshold, file_limit, normalize, mapping, exact_ratio, output_file)
     end_time = time.time()
 
     logging.info(f"Analysis completed in {end_time - start_time:.2f} seconds")
@@ -536,15 +824,15 @@ def main(original_dir, decoded_dir, threshold=0.1, output_file=None, file_limit=
     print(f"Average difference ratio: {average_difference:.2f}")
     print(f"Total time taken: {end_time - start_time:.2f} seconds")
 
-    if results:
+    if top_results:
         print("\nFiles with significant differences:")
         header = f"{'File':<50} {'Diff Ratio':<12} {'Duplicates Removed':<18} {'Buttons Renamed':<16} {'Lost Comments':<14}"
         print(header)
         print('-' * len(header))
-        for result in results[:10]:  # Print only the top 10 results
+        for result in top_results:
             print(f"{result['file']:<50} {result['difference_ratio']:<12.2f} {result['duplicates_removed']:<18} {result['buttons_renamed']:<16} {result['lost_comments']:<14}")
-        if len(results) > 10:
-            print(f"... and {len(results) - 10} more files")
+        if totals['total_files_with_differences'] > len(top_results):
+            print(f"... and {totals['total_files_with_differences'] - len(top_results)} more files")
     else:
         print("\nNo files with significant differences found.")
 
@@ -563,9 +851,10 @@ def main(original_dir, decoded_dir, threshold=0.1, output_file=None, file_limit=
         print("\nNo files were skipped.")
 
     if output_file:
-        print(f"\nWriting summarized results to {output_file}...")
-        with open(output_file, 'w', encoding='utf-8') as out_file:
-            out_file.write("Analysis Summary:\n")
+        # Per-file detail blocks were streamed during analysis; append the
+        # summary now that the totals are known
+        with open(output_file, 'a', encoding='utf-8') as out_file:
+            out_file.write("\nAnalysis Summary:\n")
             out_file.write(f"Total files processed: {totals['total_files_processed']}\n")
             out_file.write(f"Total files with significant differences: {totals['total_files_with_differences']}\n")
             out_file.write(f"Total duplicates removed: {totals['total_duplicates_removed']}\n")
@@ -574,24 +863,7 @@ def main(original_dir, decoded_dir, threshold=0.1, output_file=None, file_limit=
             out_file.write(f"Total lost comments: {totals['total_lost_comments']}\n")
             out_file.write(f"Average difference ratio: {average_difference:.2f}\n")
             out_file.write(f"Total time taken: {end_time - start_time:.2f} seconds\n")
-
-            out_file.write("\nFiles with significant differences:\n")
-            if results:
-                for result in results:
-                    out_file.write(f"\nFile: {result['file']}\n")
-                    out_file.write(f"Difference Ratio: {result['difference_ratio']:.2f}\n")
-                    out_file.write(f"Duplicates Removed: {result['duplicates_removed']}\n")
-                    out_file.write(f"Buttons Renamed: {result['buttons_renamed']}\n")
-                    out_file.write(f"Comments Re-added: {result['comments_readded']}\n")
-                    out_file.write(f"Lost Comments: {result['lost_comments']}\n")
-                    out_file.write(f"Diff Summary: {result['diff_summary']}\n")
-            else:
-                out_file.write("No files with significant differences found.\n")
-
-            out_file.write("\nSkipped files:\n")
-            for skipped in skipped_files:
-                out_file.write(f" - {skipped}\n")
-        print(f"Summarized results written to {output_file}")
+        print(f"\nSummarized results written to {output_file}")
 
     logging.info("Analysis results written to output file")
 
@@ -613,9 +885,14 @@ if __name__ == "__main__":
         parser.add_argument("--output", help="Output file for detailed results")
         parser.add_argument("--file-limit", type=int, help="Limit the number of files to process")
         parser.add_argument("--normalize", action="store_true", help="Normalize button names")
+        parser.add_argument("--exact-ratio", action="store_true", help="Use the exact (slower) SequenceMatcher difference ratio")
+        parser.add_argument("--debug", action="store_true", help="Enable per-file debug logging")
         args = parser.parse_args()
 
-        main(args.original_dir, args.decoded_dir, args.threshold, args.output, args.file_limit, args.normalize)
+        if args.debug:
+            logging.getLogger().setLevel(logging.DEBUG)
+
+        main(args.original_dir, args.decoded_dir, args.threshold, args.output, args.file_limit, args.normalize, args.exact_ratio)
     else:
         # Running in IDE
         main(DEFAULT_ORIGINAL_DIR, DEFAULT_DECODED_DIR, DEFAULT_THRESHOLD, DEFAULT_OUTPUT_FILE, DEFAULT_FILE_LIMIT, DEFAULT_NORMALIZE)
@@ -5,7 +5,7 @@ import re
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QCompleter, QLineEdit, QPushButton, QFileDialog, QLabel, QTextEdit, QMessageBox, QProgressBar, QComboBox, QFormLayout, QHBoxLayout
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QStringListModel, QTimer
 
 button_name_mapping = {
     # Power
@@ -72,10 +72,36 @@ button_name_mapping = {
     r"dry": "Dh"
 }
 
+def _build_button_pattern(mapping):
+    """
+    Fold the whole mapping into one alternation with a named group per
+    standard name, so normalization is a single C-level match instead of
+    up to ~40. Group order follows the mapping, keeping its precedence.
+
+    Each alternative is anchored with \\Z so it must consume the whole
+    cleaned name: 'please' no longer matches the 'pl' pattern for Play.
+    Case folding is done by the regex (IGNORECASE) instead of lowering
+    the name in Python first.
+    """
+    alternatives = {}
+    for pattern, standard_name in mapping.items():
+        alternatives.setdefault(standard_name, []).append(pattern)
+    parts = [f"(?P<{standard_name}>(?:{'|'.join(patterns)})\\Z)"
+             for standard_name, patterns in alternatives.items()]
+    return re.compile('|'.join(parts), re.IGNORECASE)
+
+# Compiled once at import; matched group name == standard button name
+_BUTTON_PATTERN = _build_button_pattern(button_name_mapping)
+
+# Signal fields copied verbatim while parsing (name is handled separately)
+_IR_FIELDS = frozenset({'type', 'protocol', 'address', 'command',
+                        'frequency', 'duty_cycle', 'data'})
+
 class IRFileFormatter(QWidget):
     def __init__(self):
         super().__init__()
         self.user_preferences = self.load_preferences()
+        self._created_dirs = set()
         self.init_ui()
 
     # List of common brands
@@ -150,7 +176,12 @@ class IRFileFormatter(QWidget):
         form_layout = QFormLayout()
         self.brand_input = QLineEdit(self)
         self.brand_input.setPlaceholderText("E.g., Samsung")
-        brand_completer = QCompleter(self.brands, self)
+        # A case-insensitively sorted model lets the completer binary-search
+        # prefixes instead of rescanning the whole brand list per keystroke
+        brand_model = QStringListModel(sorted(self.brands, key=str.lower), self)
+        brand_completer = QCompleter(brand_model, self)
+        brand_completer.setCaseSensitivity(Qt.CaseInsensitive)
+        brand_completer.setModelSorting(QCompleter.CaseInsensitivelySortedModel)
         self.brand_input.setCompleter(brand_completer)
         form_layout.addRow("Brand:", self.brand_input)
 
@@ -177,115 +208,140 @@ class IRFileFormatter(QWidget):
         self.output_text = QTextEdit(self)
         self.output_text.setReadOnly(True)
         self.output_text.setPlaceholderText("Processing logs will appear here...")
+        # Bound the buffer and batch appends through a timer: QTextEdit
+        # reflows the whole document per append, which stalls batch runs
+        self.output_text.document().setMaximumBlockCount(1000)
         main_layout.addWidget(self.output_text)
 
+        self._log_buffer = []
+        self._log_timer = QTimer(self)
+        self._log_timer.setInterval(100)
+        self._log_timer.timeout.connect(self._flush_log)
+        self._log_timer.start()
+
         self.setLayout(main_layout)
 
+    def log_message(self, message):
+        self._log_buffer.append(message)
+
+    def _flush_log(self):
+        if self._log_buffer:
+            self.output_text.append("\n".join(self._log_buffer))
+            self._log_buffer.clear()
+
     def browse_files(self):
-        options = QFileDialog.Options()
+        # Skip per-entry icon lookups and symlink resolution; the dialog
+        # only needs to pick a path
+        options = (QFileDialog.DontUseCustomDirectoryIcons
+                   | QFileDialog.DontResolveSymlinks
+                   | QFileDialog.ReadOnly)
         file_path, _ = QFileDialog.getOpenFileName(self, "Select .ir File", "", "IR Files (*.ir);;All Files (*)", options=options)
         if file_path:
             self.file_path_input.setText(file_path)
 
     def browse_save_directory(self):
-        save_dir = QFileDialog.getExistingDirectory(self, "Select Save Directory", options=QFileDialog.ShowDirsOnly)
+        options = (QFileDialog.ShowDirsOnly
+                   | QFileDialog.DontUseCustomDirectoryIcons
+                   | QFileDialog.DontResolveSymlinks)
+        save_dir = QFileDialog.getExistingDirectory(self, "Select Save Directory", options=options)
         if save_dir:
             self.save_dir_input.setText(save_dir)
 
     def load_preferences(self):
         if os.path.exists("user_preferences.json"):
             with open("user_preferences.json", "r") as file:
-                return json.load(file)
+                contents = file.read()
+            self._saved_preferences = contents
+            return json.loads(contents)
+        self._saved_preferences = None
         return {}
 
     def save_preferences(self):
         self.user_preferences["last_brand"] = self.brand_input.text()
         self.user_preferences["last_remote_model"] = self.remote_model_input.text()
+        # Skip the disk write when nothing changed since the last save;
+        # this runs after every processed file
+        dumped = json.dumps(self.user_preferences)
+        if dumped == self._saved_preferences:
+            return
         with open("user_preferences.json", "w") as file:
-            json.dump(self.user_preferences, file)
+            file.write(dumped)
+        self._saved_preferences = dumped
 
     def normalize_button_name(self, button_name):
-        cleaned_name = button_name.lower().replace(" ", "").replace("_", "").replace("-", "")
-        for pattern, standard_name in button_name_mapping.items():
-            if re.match(pattern, cleaned_name):
-                return standard_name
-        return button_name
+        cleaned_name = button_name.replace(" ", "").replace("_", "").replace("-", "")
+        match = _BUTTON_PATTERN.match(cleaned_name)
+        return match.lastgroup if match else button_name
 
     # Example usage during parsing
     def parse_ir_file(self, file_path):
+        ir_data = []
+        current_button = {}
         try:
             with open(file_path, 'r') as f:
-                lines = f.readlines()
+                # Stream line by line; one partition per line replaces the
+                # startswith cascade, with a hashed set lookup on the key
+                for raw in f:
+                    key, sep, value = raw.strip().partition(': ')
+                    if not sep:
+                        continue
+                    if key == 'name':
+                        if current_button:
+                            ir_data.append(current_button)
+                            current_button = {}
+                        current_button['name'] = self.normalize_button_name(value)
+                    elif key in _IR_FIELDS:
+                        current_button[key] = value
         except Exception as e:
             print(f"Failed to read the file: {e}")
             return None
-
-        ir_data = []
-        current_button = {}
-        for line in lines:
-            line = line.strip()
-            if line.startswith('name:'):
-                if current_button:
-                    ir_data.append(current_button)
-                    current_button = {}
-                user_button_name = line.split(': ')[1]
-                normalized_name = self.normalize_button_name(user_button_name)
-                current_button['name'] = normalized_name
-            elif line.startswith('type:'):
-                current_button['type'] = line.split(': ')[1]
-            elif line.startswith('protocol:'):
-                current_button['protocol'] = line.split(': ')[1]
-            elif line.startswith('address:'):
-                current_button['address'] = line.split(': ')[1]
-            elif line.startswith('command:'):
-                current_button['command'] = line.split(': ')[1]
-            elif line.startswith('frequency:'):
-                current_button['frequency'] = line.split(': ')[1]
-            elif line.startswith('duty_cycle:'):
-                current_button['duty_cycle'] = line.split(': ')[1]
-            elif line.startswith('data:'):
-                current_button['data'] = line.split(': ')[1]
         if current_button:
             ir_data.append(current_button)
 
         return ir_data
 
-    def create_ir_content(self, brand, remote_model, device_model, ir_data):
-        ir_content = "Filetype: IR signals file\nVersion: 1\n#\n"
-        ir_content += f"# {brand} {remote_model} {device_model}\n#\n"
+    def iter_ir_chunks(self, brand, remote_model, device_model, ir_data):
+        # Yield the output in chunks so saving can stream them to disk
+        # without building one big string per file
+        yield "Filetype: IR signals file\nVersion: 1\n#\n"
+        yield f"# {brand} {remote_model} {device_model}\n#\n"
 
         for button in ir_data:
-            ir_content += f"name: {button['name']}\n"
-            ir_content += f"type: {button['type']}\n"
+            yield f"name: {button['name']}\ntype: {button['type']}\n"
             if button['type'] == 'parsed':
-                ir_content += f"protocol: {button['protocol']}\n"
-                ir_content += f"address: {button['address']}\n"
-                ir_content += f"command: {button['command']}\n"
+                yield (f"protocol: {button['protocol']}\n"
+                       f"address: {button['address']}\n"
+                       f"command: {button['command']}\n")
             elif button['type'] == 'raw':
-                ir_content += f"frequency: {button['frequency']}\n"
-                ir_content += f"duty_cycle: {button['duty_cycle']}\n"
-                ir_content += f"data: {button['data']}\n"
-            ir_content += "#\n"
+                yield (f"frequency: {button['frequency']}\n"
+                       f"duty_cycle: {button['duty_cycle']}\n"
+                       f"data: {button['data']}\n")
+            yield "#\n"
 
-        return ir_content
+    def create_ir_content(self, brand, remote_model, device_model, ir_data):
+        return "".join(self.iter_ir_chunks(brand, remote_model, device_model, ir_data))
 
-    def save_ir_file(self, brand, remote_model, ir_content, original_filename):
+    def save_ir_file(self, brand, remote_model, device_model, ir_data, original_filename):
         try:
             device_type = self.device_type_combo.currentText()
             save_dir = self.save_dir_input.text().strip()
             if not save_dir:
                 save_dir = os.getcwd()  # Use the current working directory if no directory is specified
-            
+
             directory = os.path.join(save_dir, device_type)
-            os.makedirs(directory, exist_ok=True)
+            # makedirs stats every path component; batch runs hit the same
+            # device-type folder repeatedly, so remember what we created
+            if directory not in self._created_dirs:
+                os.makedirs(directory, exist_ok=True)
+                self._created_dirs.add(directory)
 
             filename = f"{brand}_{remote_model}.ir"
             file_path = os.path.join(directory, filename)
 
             with open(file_path, 'w') as f:
-                f.write(ir_content)
+                f.writelines(self.iter_ir_chunks(brand, remote_model, device_model, ir_data))
 
-            self.output_text.append(f"IR file saved as {file_path}")
+            self.log_message(f"IR file saved as {file_path}")
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to save the file: {e}")
 
@@ -313,14 +369,11 @@ class IRFileFormatter(QWidget):
         if ir_data is None:
             return  # Parsing failed, already handled
 
-        self.progress_bar.setValue(50)
-        ir_content = self.create_ir_content(brand, remote_model, device_model, ir_data)
-
         self.progress_bar.setValue(75)
-        self.save_ir_file(brand, remote_model, ir_content, os.path.basename(file_path))
+        self.save_ir_file(brand, remote_model, device_model, ir_data, os.path.basename(file_path))
 
         self.progress_bar.setValue(100)
-        self.output_text.append("Processing completed successfully.")
+        self.log_message("Processing completed successfully.")
 
         # Save user preferences
         self.save_preferences()
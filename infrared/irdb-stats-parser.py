@@ -1,9 +1,12 @@
+import argparse
 import requests
 import zipfile
 import json
 import os
 import shutil
-from io import BytesIO
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
 # Get the directory of the script
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -13,86 +16,155 @@ REPO_URL = "https://github.com/Lucaslhm/Flipper-IRDB/archive/refs/heads/main.zip
 
 def download_and_extract_repo():
     print("Downloading repository...")
-    response = requests.get(REPO_URL)
-    if response.status_code != 200:
-        raise Exception(f"Failed to download repository: Status code {response.status_code}")
-    
+    # Stream into a spooled temp file (spills to disk past 32MB) instead of
+    # holding the whole ZIP in memory twice via response.content + BytesIO
+    spool = tempfile.SpooledTemporaryFile(max_size=32 << 20)
+    with requests.get(REPO_URL, stream=True) as response:
+        response.raise_for_status()
+        shutil.copyfileobj(response.raw, spool, length=1 << 20)
+
     print("Extracting files...")
-    with zipfile.ZipFile(BytesIO(response.content)) as zip_ref:
-        zip_ref.extractall(SCRIPT_DIR)
-    
+    spool.seek(0)
+    with zipfile.ZipFile(spool) as zip_ref:
+        # Only the .ir files matter to the parser; skip extracting the
+        # repo's images, docs and workflow files
+        wanted = [name for name in zip_ref.namelist()
+                  if name.endswith('.ir') or name.endswith('/')]
+        zip_ref.extractall(SCRIPT_DIR, members=wanted)
+
     # The extracted folder name
     return os.path.join(SCRIPT_DIR, "Flipper-IRDB-main")
 
-def parse_directory(path, depth=0):
+def _new_counts():
+    return {'total': 0, 'by_device_type': Counter(), 'by_brand': Counter()}
+
+def parse_directory(path, depth=0, counts=None):
     data = {'name': os.path.basename(path), 'children': []}
-    
-    for item in os.listdir(path):
-        item_path = os.path.join(path, item)
-        if os.path.isdir(item_path):
-            child_data = parse_directory(item_path, depth + 1)
-            if child_data['children']:  # Only add non-empty directories
-                data['children'].append(child_data)
-        elif item.endswith('.ir'):
-            brand, model = extract_brand_and_model(item)
-            file_data = {
-                'name': item,
-                'size': os.path.getsize(item_path),
-                'brand': brand,
-                'model': model
-            }
-            if depth == 1:  # Device Type level
-                file_data['device_type'] = data['name']
-            elif depth == 2:  # Brand level
-                file_data['device_type'] = os.path.basename(os.path.dirname(path))
-                file_data['brand'] = data['name']
-            data['children'].append(file_data)
-    
+
+    # scandir yields entries with type info cached from the directory read,
+    # so there is no per-entry isdir stat or join
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                child_data = parse_directory(entry.path, depth + 1, counts)
+                if child_data['children']:  # Only add non-empty directories
+                    data['children'].append(child_data)
+            elif entry.name.endswith('.ir'):
+                brand, model = extract_brand_and_model(entry.name)
+                file_data = {
+                    'name': entry.name,
+                    'size': entry.stat(follow_symlinks=False).st_size,
+                    'brand': brand,
+                    'model': model
+                }
+                if depth == 1:  # Device Type level
+                    file_data['device_type'] = data['name']
+                elif depth == 2:  # Brand level
+                    file_data['device_type'] = os.path.basename(os.path.dirname(path))
+                    file_data['brand'] = data['name']
+                # Stats accumulate during the walk itself, so no second
+                # traversal of the finished tree is needed
+                if counts is not None and 'device_type' in file_data:
+                    counts['total'] += 1
+                    counts['by_device_type'][file_data['device_type']] += 1
+                    counts['by_brand'][file_data['brand']] += 1
+                data['children'].append(file_data)
+
     return data
 
-def extract_brand_and_model(filename):
-    name_without_ext = os.path.splitext(filename)[0]
-    parts = name_without_ext.split('_', 1)
-    if len(parts) == 2:
-        return parts[0], parts[1]
-    else:
-        return name_without_ext, ""
-
-def count_files_by_category(data):
-    counts = {
-        'total': 0,
-        'by_device_type': {},
-        'by_brand': {}
-    }
-
-    def count_recursive(node):
-        if 'device_type' in node:
-            counts['total'] += 1
-            device_type = node['device_type']
-            brand = node['brand']
-            counts['by_device_type'][device_type] = counts['by_device_type'].get(device_type, 0) + 1
-            counts['by_brand'][brand] = counts['by_brand'].get(brand, 0) + 1
+def parse_repo(repo_path, tree_out=None):
+    """
+    Parse the repo tree, walking each top-level device-type subtree in its
+    own thread. The walk is readdir/stat-bound, so threads overlap the
+    syscall latency; each subtree stays single-threaded.
+
+    If tree_out is given, the tree JSON is streamed into it one finished
+    subtree at a time, so peak memory is a single subtree instead of the
+    whole tree, and None is returned for the tree. Returns (tree, counts).
+    """
+    children = [] if tree_out is None else None
+    counts = _new_counts()
+
+    if tree_out is not None:
+        tree_out.write('{"name": %s, "children": [' % json.dumps(os.path.basename(repo_path)))
+    first_child = True
+
+    def emit(node):
+        nonlocal first_child
+        if tree_out is None:
+            children.append(node)
         else:
-            for child in node.get('children', []):
-                count_recursive(child)
+            if not first_child:
+                tree_out.write(', ')
+            tree_out.write(json.dumps(node))
+            first_child = False
 
-    count_recursive(data)
-    return counts
+    subdirs = []
+    with os.scandir(repo_path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.name.endswith('.ir'):
+                brand, model = extract_brand_and_model(entry.name)
+                emit({
+                    'name': entry.name,
+                    'size': entry.stat(follow_symlinks=False).st_size,
+                    'brand': brand,
+                    'model': model
+                })
+
+    def parse_subtree(path):
+        # Each thread fills its own counts; merged below, so no shared
+        # mutation across threads
+        subtree_counts = _new_counts()
+        return parse_directory(path, 1, subtree_counts), subtree_counts
+
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+        for child_data, subtree_counts in executor.map(parse_subtree, subdirs):
+            if child_data['children']:  # Only add non-empty directories
+                emit(child_data)
+            counts['total'] += subtree_counts['total']
+            counts['by_device_type'].update(subtree_counts['by_device_type'])
+            counts['by_brand'].update(subtree_counts['by_brand'])
+
+    if tree_out is not None:
+        tree_out.write(']}')
+        return None, counts
+    return {'name': os.path.basename(repo_path), 'children': children}, counts
+
+def extract_brand_and_model(filename):
+    # Every caller has already filtered for .ir, so slicing the suffix
+    # off beats a general splitext; partition avoids building a list
+    name = filename[:-3] if filename.endswith('.ir') else os.path.splitext(filename)[0]
+    brand, sep, model = name.partition('_')
+    return (brand, model) if sep else (name, "")
 
 def main():
+    parser = argparse.ArgumentParser(description="Parse the Flipper-IRDB repo and emit statistics")
+    parser.add_argument('--emit-tree', action='store_true',
+                        help="also write the full directory tree to irdb_data.json")
+    args = parser.parse_args()
+
     try:
         repo_path = download_and_extract_repo()
         print("Parsing directory structure...")
-        data = parse_directory(repo_path)
-        
-        output_path = os.path.join(SCRIPT_DIR, 'irdb_data.json')
-        with open(output_path, 'w') as f:
-            json.dump(data, f)
-        
-        print(f"Data saved to: {output_path}")
+        if args.emit_tree:
+            output_path = os.path.join(SCRIPT_DIR, 'irdb_data.json')
+            with open(output_path, 'w') as f:
+                # Stream the tree JSON while walking instead of building it all
+                _, counts = parse_repo(repo_path, tree_out=f)
+            print(f"Data saved to: {output_path}")
+        else:
+            # Counts accumulate during the walk either way; most runs only
+            # want the stats, so skip writing the multi-MB tree file
+            _, counts = parse_repo(repo_path)
 
-        # Generate and save statistics
-        stats = count_files_by_category(data)
+        # Statistics were gathered during the walk
+        stats = {
+            'total': counts['total'],
+            'by_device_type': dict(counts['by_device_type']),
+            'by_brand': dict(counts['by_brand'])
+        }
         stats_path = os.path.join(SCRIPT_DIR, 'irdb_stats.json')
         with open(stats_path, 'w') as f:
             json.dump(stats, f, indent=2)